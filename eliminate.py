@@ -1,35 +1,37 @@
 
 from tqdm import tqdm
 
-from typing import List
+from typing import List, Union
 import random
 
 
 # find the first True value in the list
-def binaryElimination(_list: List[bool]) -> int:
-    left = 0
-    right = len(_list) - 1
-
-    while left <= right:
-        mid = (left + right) // 2
-        if any(_list[left:mid + 1]):
-            right = mid - 1
-        else:
-            left = mid + 1
-
-    return right + 1
+def binaryElimination(_list: Union[List[bool], bytearray]) -> int:
+    # a single C-level scan beats log(n) rounds of slice + any()
+    try:
+        return _list.index(True)
+    except ValueError:
+        return len(_list)
 
 
 if __name__ == '__main__':
-    _list = [False] * 1024
-    for _ in tqdm(range(0, 5000000)):
-        random_number = random.randint(0, 1023)
-        _list[random_number] = True
+    # one byte per slot; bytearray.index is a memchr over 1 kB
+    _list = bytearray(1 << 10)
+    # redraw a few times a second rather than on every iteration
+    for _ in tqdm(
+                range(0, 5000000),
+                miniters=100000,
+                mininterval=0.5,
+                smoothing=0
+            ):
+        # a single C call, where randint goes through randrange in python
+        random_number = random.getrandbits(10)
+        _list[random_number] = 1
         result = binaryElimination(_list)
 
         if result != random_number:
             print(f'Failure!! {result}')
             exit()
 
-        _list[random_number] = False
+        _list[random_number] = 0
     print('Success!!')
@@ -1,20 +1,50 @@
 
-from attrs import define
-
-from typing import List, Union, Optional, Generator, cast
-from zipfile import ZipFile, Path
+from typing import List, Set, Union, Optional, Generator, cast
+from typing import BinaryIO
+from zipfile import ZipFile
 from abc import ABC, abstractmethod
 import hashlib
+import mmap
 import os
 
 
-BUF_SIZE = 65536  # 64 kB
+BUF_SIZE = 262144  # 256 kB
+HASH_BUF_SIZE = 1048576  # 1 MB
+
+
+SEPARATORS = tuple(sep for sep in (os.sep, os.altsep) if sep)
+
+
+# every child path here is '<dir><sep><entry>', which doesn't need the
+# argument checks os.path.join does; fall back to it for the edge cases
+def _join_path(base: str, name: str) -> str:
+    if not base or base.endswith(SEPARATORS) or os.path.isabs(name):
+        return os.path.join(base, name)
+    return base + os.sep + name
+
+
+# tell the kernel a file will be read front to back so it reads ahead
+# more aggressively; not available on windows/macos
+def _advise_sequential(fd: int) -> None:
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
 
 
-@define
 class FileBase(ABC):
-    parent: Optional['DirectoryBase']
-    name: str
+    __slots__ = ('parent', 'name', 'full_path')
+
+    parent:     Optional['DirectoryBase']
+    name:       str
+    # derived from parent/name once; rename() keeps it in sync
+    full_path:  str
+
+    def __init__(self, parent: Optional['DirectoryBase'], name: str):
+        self.parent = parent
+        self.name = name
+        if parent is not None:
+            self.full_path = _join_path(parent.full_path, name)
+        else:
+            self.full_path = name
 
     @abstractmethod
     def __len__(self) -> int:
@@ -35,33 +65,38 @@ class FileBase(ABC):
     # @abstractmethod
     # def watch(self): ...
 
-    @property
-    def full_path(self) -> str:
-        if self.parent is not None:
-            return os.path.join(self.parent.full_path, self.name)
-        else:
-            return self.name
-
     def read(self) -> bytes:
         return b''.join(self._read(BUF_SIZE))
 
     def read_large(self, buffer_size: int = 0) -> Generator[bytes, None, None]:
         if buffer_size <= 0:
             buffer_size = BUF_SIZE
-        while data := self._read(buffer_size):
-            yield cast(bytes, data)
+        yield from self._read(buffer_size)
 
     def hash(self) -> str:
         md5 = hashlib.md5(usedforsecurity=False)
-        for chunk in self.read_large():
+        for chunk in self.read_large(HASH_BUF_SIZE):
             md5.update(chunk)
         return md5.hexdigest()
 
+    def contains(self, needle: bytes) -> bool:
+        return needle in self.read()
+
 
-@define
 class DirectoryBase(ABC):
-    parent: Optional['DirectoryBase']
-    name: str
+    __slots__ = ('parent', 'name', 'full_path')
+
+    parent:     Optional['DirectoryBase']
+    name:       str
+    full_path:  str
+
+    def __init__(self, parent: Optional['DirectoryBase'], name: str):
+        self.parent = parent
+        self.name = name
+        if parent is not None:
+            self.full_path = _join_path(parent.full_path, name)
+        else:
+            self.full_path = name
 
     @abstractmethod
     def list(self) -> List[Union[FileBase, 'DirectoryBase']]:
@@ -78,58 +113,103 @@ class DirectoryBase(ABC):
     def __getitem__(self, key: str) -> Union[FileBase, 'DirectoryBase']:
         return self.get(key)
 
-    @property
-    def full_path(self) -> str:
-        if self.parent is not None:
-            return os.path.join(self.parent.full_path, self.name)
-        else:
-            return self.name
-
 
-@define
 class FileReal(FileBase):
+    __slots__ = ('_entry',)
+
+    # set by DirectoryReal.list; DirEntry caches its stat() result (and
+    # gets it for free from the directory scan on windows)
+    _entry:     Optional['os.DirEntry[str]']
+
+    def __init__(
+                self,
+                parent: Optional[DirectoryBase],
+                name: str,
+                entry: Optional['os.DirEntry[str]'] = None
+            ):
+        super().__init__(parent, name)
+        self._entry = entry
+
     def __len__(self) -> int:
+        if self._entry is not None:
+            return self._entry.stat().st_size
         return os.path.getsize(self.full_path)
 
-    def _read(self, buffer_size: int):
-        self.parent = cast(DirectoryBase, self.parent)
-        if self.parent.has(self.name) or os.path.isfile(self.full_path):
-            with open(self.full_path, 'rb') as file:
-                while True:
-                    data = file.read(buffer_size)
-                    if not data:
-                        break
-                    yield data
-        else:
+    def read(self) -> bytes:
+        # readall() sizes a single buffer from fstat, so this skips
+        # collecting BUF_SIZE chunks and joining them afterwards
+        with self._open() as file:
+            return file.read()
+
+    def hash(self) -> str:
+        # hash straight out of the page cache, no copies into python
+        md5 = hashlib.md5(usedforsecurity=False)
+        with self._open() as file:
+            if os.fstat(file.fileno()).st_size > 0:  # can't map empty files
+                with mmap.mmap(
+                            file.fileno(), 0, access=mmap.ACCESS_READ
+                        ) as data:
+                    if hasattr(mmap, 'MADV_SEQUENTIAL'):
+                        data.madvise(mmap.MADV_SEQUENTIAL)
+                    md5.update(data)
+        return md5.hexdigest()
+
+    def contains(self, needle: bytes) -> bool:
+        # search the mapped file in place instead of reading it into memory
+        with self._open() as file:
+            if os.fstat(file.fileno()).st_size == 0:  # can't map empty files
+                return not needle
+            with mmap.mmap(
+                        file.fileno(), 0, access=mmap.ACCESS_READ
+                    ) as data:
+                return data.find(needle) != -1
+
+    def _open(self) -> BinaryIO:
+        try:
+            return open(self.full_path, 'rb')
+        except FileNotFoundError:
+            parent = cast(DirectoryBase, self.parent)
             raise FileNotFoundError(
-                f"Could not find {self.name} in {self.parent.full_path} "
+                f"Could not find {self.name} in {parent.full_path} "
                 f"as {self.full_path}"
             )
 
+    def _read(self, buffer_size: int):
+        with self._open() as file:
+            _advise_sequential(file.fileno())
+            while data := file.read(buffer_size):
+                yield data
+
     def rename(self, new_name: str) -> None:
         parent_dir = cast(DirectoryBase, self.parent).full_path
-        new_path = os.path.join(parent_dir, new_name)
+        new_path = _join_path(parent_dir, new_name)
         os.rename(self.full_path, new_path)
         self.name = new_name
+        self.full_path = new_path
+        self._entry = None
 
     def write(self, content: bytes) -> None:
-        self.parent = cast(DirectoryBase, self.parent)
-        if self.parent.has(self.name) or os.path.isfile(self.full_path):
+        parent = cast(DirectoryBase, self.parent)
+        if parent.has(self.name) or os.path.isfile(self.full_path):
             with open(self.full_path, 'wb') as file:
                 file.write(content)
+            self._entry = None
 
 
-@define
 class DirectoryReal(DirectoryBase):
+    __slots__ = ()
+
     def list(self) -> List[Union[FileBase, 'DirectoryBase']]:
         children: List[Union[FileBase, 'DirectoryBase']] = []
 
-        for item in os.listdir(self.full_path):
-            if os.path.isfile(os.path.join(self.full_path, item)):
-                children.append(FileReal(self, item))
-            elif os.path.isdir(os.path.join(self.full_path, item)):
-                item_path = os.path.join(self.full_path, item)
-                children.append(DirectoryReal(self, item_path))
+        # scandir reports the entry type from readdir, so most entries
+        # need no stat() at all
+        with os.scandir(self.full_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    children.append(FileReal(self, entry.name, entry))
+                elif entry.is_dir():
+                    children.append(DirectoryReal(self, entry.name))
 
         return children
 
@@ -140,41 +220,77 @@ class DirectoryReal(DirectoryBase):
         return os.path.exists(os.path.join(self.full_path, item))
 
 
-@define
 class DirectoryZip(DirectoryBase):
-    _zip: Optional[ZipFile]
+    __slots__ = ('_zip', '_names', '_dirs')
+
+    _zip:       Optional[ZipFile]
+    # member names, read once from the central directory so lookups
+    # don't rescan it
+    _names:     Set[str]
+    # every directory prefix ('a/', 'a/b/'); only built the first time
+    # something asks about a directory, most jars are only asked about files
+    _dirs:      Optional[Set[str]]
+
+    def __init__(
+                self,
+                parent: Optional[DirectoryBase],
+                name: str,
+                zip_file: Optional[ZipFile]
+            ):
+        super().__init__(parent, name)
+        self._zip = zip_file
+        self._names = set(zip_file.namelist()) if zip_file else set()
+        self._dirs = None
+
+    def _directories(self) -> Set[str]:
+        if self._dirs is None:
+            self._dirs = set()
+            for member in self._names:
+                end = member.find('/')
+                while end != -1:
+                    self._dirs.add(member[:end + 1])
+                    end = member.find('/', end + 1)
+        return self._dirs
 
     def list(self) -> List[Union[FileBase, 'DirectoryBase']]:
         children: List[Union[FileBase, 'DirectoryBase']] = []
 
-        self._zip = cast(ZipFile, self._zip)
-        for item in self._zip.infolist():
+        zip_file = cast(ZipFile, self._zip)
+        for item in zip_file.infolist():
             if not item.is_dir():
-                children.append(FileZip(item.filename, self))
+                children.append(FileZip(self, item.filename))
 
         return children
 
     def get(self, item: str) -> Union[FileBase, DirectoryBase]:
-        self._zip = cast(ZipFile, self._zip)
-        result = Path(self._zip, item)
-        if result.is_dir():
+        if item.endswith('/') and item in self._directories():
             return DirectoryZip(self, item, self._zip)
         else:
             return FileZip(parent=self, name=item)
 
     def has(self, item: str) -> bool:
-        self._zip = cast(ZipFile, self._zip)
-        path = Path(self._zip, item)
-        return path.is_file() or path.is_dir()
+        if item in self._names:
+            return True
+        # directory prefixes all end in '/', other misses can skip them
+        return item.endswith('/') and item in self._directories()
 
 
-@define
 class FileZip(FileBase):
-    parent: DirectoryZip
+    __slots__ = ()
+
+    parent:     DirectoryZip
+
+    def __init__(self, parent: DirectoryZip, name: str):
+        super().__init__(parent, name)
 
     def __len__(self) -> int:
         return cast(ZipFile, self.parent._zip).getinfo(self.name).file_size
 
+    def read(self) -> bytes:
+        # the member size is in the central directory, so ZipFile.read
+        # decompresses into one buffer without the chunk generator
+        return cast(ZipFile, self.parent._zip).read(self.name)
+
     def _read(self, buffer_size: int) -> Generator[bytes, None, None]:
         zip_file = cast(ZipFile, self.parent._zip)
         with zip_file.open(self.name, 'r') as file:
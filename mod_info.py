@@ -1,17 +1,27 @@
 
-from pygtail import Pygtail  # type: ignore
-from attrs import define
 from tqdm import tqdm
-import toml
-
-from typing import cast, List, Dict, Union, Any, Optional, Set
+import sys
+if sys.version_info >= (3, 11):
+    import tomllib
+else:  # tomllib's upstream, same api
+    import tomli as tomllib
+
+from typing import cast, List, Dict, Union, Any, Optional, Set, Tuple, Iterator
+from typing import IO, Callable
+from concurrent.futures import ProcessPoolExecutor
+from graphlib import TopologicalSorter, CycleError
+from itertools import chain, islice
 from zipfile import ZipFile
+import tempfile
+import pickle
+import shutil
 import io
 import os
 import re
 
-from filesystem import FileBase, FileReal, DirectoryZip, DirectoryReal, FileZip
-from version import VersionRange, Version, BadVersionString
+from filesystem import FileReal, DirectoryZip, DirectoryReal
+from filesystem import BUF_SIZE
+from version import VersionRange, Version, VersionKey, BadVersionString
 
 
 class DependencyFailure(Exception):
@@ -21,24 +31,87 @@ class DependencyFailure(Exception):
 class ModDependency:
     modid: str
     required: bool
-    version_reqs: List[VersionRange]
+    _version_reqs: List[VersionRange]
+    # str() of the ranges, printed for every dependency in the reports
+    _str: str
+    # Version._key -> whether the ranges accept it; contains() only
+    # looks at the key, so versions like '1' and '1.0' share an entry
+    _accepts: Dict[VersionKey, bool]
 
     def __init__(self, modid: str, required: bool, version_range: str):
         self.modid = modid
         self.required = required
         self.version_reqs = VersionRange.fromString(version_range)
 
+    @property
+    def version_reqs(self) -> List[VersionRange]:
+        return self._version_reqs
+
+    @version_reqs.setter
+    def version_reqs(self, version_reqs: List[VersionRange]) -> None:
+        self._version_reqs = version_reqs
+        self._str = ','.join(map(str, version_reqs))
+        self._accepts = {}
+
     def __str__(self) -> str:
-        return ','.join([str(req) for req in self.version_reqs])
+        return self._str
+
+    def accepts(self, version: Version) -> bool:
+        result = self._accepts.get(version._key)
+        if result is None:
+            result = any(req.contains(version) for req in self.version_reqs)
+            self._accepts[version._key] = result
+        return result
 
     def validateMod(self, mod: 'Mod') -> bool:
         if mod.modid != self.modid:
             return False
-        for version_req in self.version_reqs:
-            if version_req.contains(mod._version):
-                return True
-        return False
+        return self.accepts(mod._version)
+
+
+# reverse edge of a ModDependency, recorded on the mod being depended on;
+# shares the requirement instead of parsing a new one
+class Dependent:
+    modid:          str
+    requirement:    ModDependency
+
+    def __init__(self, modid: str, requirement: ModDependency):
+        self.modid = modid
+        self.requirement = requirement
+
+    @property
+    def version_reqs(self) -> List[VersionRange]:
+        return self.requirement.version_reqs
+
+    def accepts(self, version: Version) -> bool:
+        return self.requirement.accepts(version)
+
+
+# a failed requirement recorded by validateVersions; only formatted when
+# the errors are printed, most runs just count them
+class DependencyError:
+    modid:          str
+    requirement:    ModDependency
+    missing:        bool
+
+    def __init__(self, modid: str, requirement: ModDependency, missing: bool):
+        self.modid = modid
+        self.requirement = requirement
+        self.missing = missing
+
+    def __str__(self) -> str:
+        if self.missing:
+            return (
+                f"Could not find mod '{self.modid}'! "
+                f"requirements: {self.requirement.version_reqs}"
+            )
+        return f"'{self.modid}' requires '{self.requirement.version_reqs}'"
+
+
+# not real mods; never graphed or disabled
+EXCLUDED_MODIDS = frozenset(('minecraft', 'forge'))
 
+EXTERN_RE = re.compile(r'\${([^}]+)}')
 
 MANIFEST_MAPPING: Dict[str, Union[str, List[str]]] = {
     'file.jarVersion': [
@@ -52,14 +125,58 @@ MANIFEST_MAPPING: Dict[str, Union[str, List[str]]] = {
 }
 
 
+# MANIFEST_MAPPING turned into one resolver per field at import time, so
+# resolving a field is a dict lookup and a call
+ManifestResolver = Callable[[Dict[str, str]], str]
+
+
+def _constant_resolver(value: str) -> ManifestResolver:
+    return lambda manifest: value
+
+
+def _attribute_resolver(keys: Tuple[str, ...]) -> ManifestResolver:
+    # first of the attributes that is present and non-empty
+    return lambda manifest: next(
+        (manifest[key] for key in keys if manifest.get(key)), ""
+    )
+
+
+MANIFEST_RESOLVERS: Dict[str, ManifestResolver] = {
+    field: (
+        _constant_resolver(mapping) if isinstance(mapping, str)
+        else _attribute_resolver(tuple(mapping))
+    )
+    for field, mapping in MANIFEST_MAPPING.items()
+}
+
+
+# resolves an external reference `${<var_name>}` in a mods.toml field,
+# looking it up in MANIFEST_RESOLVERS and the jar's manifest attributes
+def _process_external_field(field_raw: str, manifest: Dict[str, str]) -> str:
+    if '${' not in field_raw:
+        return field_raw
+    extern = EXTERN_RE.match(field_raw)
+    if not extern:
+        return field_raw
+
+    resolver = MANIFEST_RESOLVERS.get(extern.group(1))
+    if resolver is None:
+        return field_raw
+
+    result = resolver(manifest)
+    if result == "":
+        raise ValueError(f"failed to process field value {field_raw}")
+    return result
+
+
 class Mod:
     filename:       str
     name:           str
     modid:          str
     _version:       Version
     dependencies:   List[ModDependency]
-    dependents:     List[ModDependency]
-    errors:         List[str]
+    dependents:     List[Dependent]
+    errors:         List[Union[str, DependencyError]]
 
     pack:           'ModPack'
     manifest:       Dict[str, str]
@@ -67,6 +184,8 @@ class Mod:
     parent:         Optional['Mod']
 
     def __init__(self, pack: 'ModPack'):
+        self.name = ''
+        self.modid = ''  # stays empty when the jar has no [[mods]] entry
         self.dependencies = []
         self.dependents = []
         self.errors = []
@@ -98,91 +217,66 @@ class Mod:
                 pack: 'ModPack',
                 filename: str,
                 toml_data: Dict[str, Any],
-                manifest: str
+                attributes: Dict[str, str]
             ) -> 'Mod':
         instance = cls(pack)
         instance.filename = filename
+        instance.manifest = attributes
 
-        if manifest != "":
-            manifest = manifest.replace('\r\n', '\n')
-            while '\n\n' in manifest:
-                manifest = manifest.replace('\n\n', '\n')
-
-            for line in manifest.split('\n'):
-                parts = line.split(':')
-                if len(parts) == 2:
-                    instance.manifest[parts[0].strip()] = parts[1].strip()
-
-        def processExternalField(field_raw: str) -> str:
-            # checks if string is an external reference `${<var_name>}`
-            extern = re.match(r'\${([^}]+)}', field_raw)
-            if not extern:
-                return field_raw
-
-            field = cast(str, extern.groups(1)[0])
-            map = MANIFEST_MAPPING.get(field, None)
-
-            if type(map) is str:
-                return map
-            elif type(map) is list:
-                result: str = ""
-                for key in map:
-
-                    result = instance.manifest.get(key, "")
-                    if result:
-                        break
-
-                if result == "":
-                    raise ValueError(
-                        f"failed to process field value {field_raw}"
-                    )
-                return result
-
-            elif map is None:
-                return field_raw
-            else:
-                raise ValueError(f"failed to process field value {field_raw}")
+        if "mods" not in toml_data or len(toml_data['mods']) == 0:
+            return instance
 
-        if "mods" in toml_data and len(toml_data['mods']) > 0:
-            mod = toml_data['mods'][0]
+        mod = toml_data['mods'][0]
 
-            instance.modid = processExternalField(mod['modId'])
-            instance._version = Version.fromString(
-                processExternalField(mod['version'])
-            )
-            instance.name = processExternalField(mod["displayName"])
-            instance.toml_data = toml_data
-
-            toml_deps_len = len(toml_data["dependencies"])
-            if "dependencies" in toml_data and toml_deps_len > 0:
-                deps = toml_data["dependencies"]
-                if instance.modid in deps and len(deps[instance.modid]) > 0:
-                    for dependency in deps[instance.modid]:
-                        try:
-                            version_range = processExternalField(
-                                dependency['versionRange']
-                            )
-                            instance.dependencies.append(
-                                ModDependency(
-                                    dependency["modId"],
-                                    dependency['mandatory'],
-                                    version_range
-                                )
-                            )
-                        except BadVersionString as e:
-                            instance.errors.append(
-                                f"'{instance.name}' dependency "
-                                f"'{dependency['modId']}' has invalid "
-                                f"version range '{dependency['versionRange']}'"
+        instance.modid = _process_external_field(mod['modId'], attributes)
+        instance._version = Version.fromString(
+            _process_external_field(mod['version'], attributes)
+        )
+        instance.name = _process_external_field(
+            mod["displayName"], attributes
+        )
+        instance.toml_data = toml_data
+
+        deps = toml_data.get("dependencies", {})
+        if instance.modid in deps and len(deps[instance.modid]) > 0:
+            try:
+                # all ranges usually parse, so build them in one go;
+                # extend() adds nothing if any of them raises
+                instance.dependencies.extend([
+                    ModDependency(
+                        dependency["modId"],
+                        dependency['mandatory'],
+                        _process_external_field(
+                            dependency['versionRange'], attributes
+                        )
+                    )
+                    for dependency in deps[instance.modid]
+                ])
+            except BadVersionString:
+                # redo them one at a time to report the bad ones
+                for dependency in deps[instance.modid]:
+                    try:
+                        version_range = _process_external_field(
+                            dependency['versionRange'], attributes
+                        )
+                        instance.dependencies.append(
+                            ModDependency(
+                                dependency["modId"],
+                                dependency['mandatory'],
+                                version_range
                             )
+                        )
+                    except BadVersionString as e:
+                        instance.errors.append(
+                            f"'{instance.name}' dependency "
+                            f"'{dependency['modId']}' has invalid "
+                            f"version range '{dependency['versionRange']}'"
+                        )
 
         return instance
 
 
 class DependencyGraph:
-    _ALL_GRAPHS:    Dict[str, 'DependencyGraph'] = {}
-    _ALL_NODES:     Dict[str, 'Node'] = {}
-
     class Node:
         mod_set:    Set[Mod]
         graph:      'DependencyGraph'
@@ -190,43 +284,61 @@ class DependencyGraph:
         def __init__(self, mod: Mod, graph: 'DependencyGraph'):
             self.mod_set = {mod}
             self.graph = graph
-            if mod.modid in DependencyGraph._ALL_NODES:
+            if mod.modid in graph.node_index:
                 raise ValueError(f"modid '{mod.modid}' already has a node")
 
         def merge(self, other: 'DependencyGraph.Node') -> None:
-            self.mod_set.union(other.mod_set)
+            if self is other:  # would empty our own mod_set below
+                return
+            self.graph._mod_count -= len(self.mod_set)
+            other.graph._mod_count -= len(other.mod_set)
+            self.mod_set |= other.mod_set
+            self.graph._mod_count += len(self.mod_set)
             for mod in other.mod_set:
-                DependencyGraph._ALL_GRAPHS[mod.modid] = self.graph
-                DependencyGraph._ALL_NODES[mod.modid] = self
-            other.mod_set = set()
+                self.graph.node_index[mod.modid] = self
+            other.mod_set.clear()
+            other.graph.nodes.remove(other)
 
+        # iterated lazily rather than copied into a new list per access
         @property
-        def dependencies(self) -> List[ModDependency]:
-            deps = []
-            for mod in self.mod_set:
-                deps.extend(mod.dependencies)
-            return deps
+        def dependencies(self) -> Iterator[ModDependency]:
+            return chain.from_iterable(
+                mod.dependencies for mod in self.mod_set
+            )
 
         @property
-        def dependents(self) -> List[ModDependency]:
-            deps = []
-            for mod in self.mod_set:
-                deps.extend(mod.dependents)
-            return deps
+        def dependents(self) -> Iterator[Dependent]:
+            return chain.from_iterable(
+                mod.dependents for mod in self.mod_set
+            )
 
-    nodes: List[Node]
+    nodes:      List[Node]
+    # modid -> node, shared by every graph built in one pass; owned by the
+    # caller so nothing outlives an identifyBrokenMods run
+    node_index: Dict[str, Node]
+    # total mods across nodes, kept up to date by the merges
+    _mod_count: int
 
-    def __init__(self, mod: Mod):
+    def __init__(self, mod: Mod, node_index: Dict[str, Node]):
+        self.node_index = node_index
         self.nodes = [DependencyGraph.Node(mod, self)]
+        self._mod_count = 1
+
+    @property
+    def mod_count(self) -> int:
+        return self._mod_count
 
     def merge(self, other: 'DependencyGraph') -> None:
+        if self is other:  # would empty our own node list below
+            return
         for node in other.nodes:
             for mod in node.mod_set:
-                DependencyGraph._ALL_GRAPHS[mod.modid] = self
-                DependencyGraph._ALL_NODES[mod.modid] = node
+                self.node_index[mod.modid] = node
             node.graph = self
             self.nodes.append(node)
         other.nodes = []
+        self._mod_count += other._mod_count
+        other._mod_count = 0
 
     def disable_all(self) -> None:
         for node in self.nodes:
@@ -239,6 +351,136 @@ class DependencyGraph:
                 mod.enable()
 
 
+# (path, mods.toml data, MANIFEST.MF attributes) for each mods.toml in a jar
+JarEntry = Tuple[str, Dict[str, Any], Dict[str, str]]
+
+
+def _read_manifest(stream: IO[bytes]) -> Dict[str, str]:
+    raw: Dict[str, str] = {}
+    key = ''
+    # the attributes we use are ascii; latin-1 maps bytes straight to
+    # code points and can't fail on a badly encoded manifest. universal
+    # newlines take care of CRLF and bare CR line endings
+    with io.TextIOWrapper(stream, encoding='latin-1') as text:
+        for line in text:
+            line = line.rstrip('\n')
+            if not line:
+                continue
+            if line[0] == ' ':  # continues the previous value
+                if key:
+                    raw[key] += line[1:]
+                continue
+            name, sep, value = line.partition(':')
+            key = name.strip() if sep else ''
+            if key:
+                raw[key] = value
+    return {name: value.strip() for name, value in raw.items()}
+
+
+NESTED_JAR_SPOOL_SIZE = 1048576  # 1 MB
+
+
+def _process_jar(jar: DirectoryZip, entries: List[JarEntry]) -> bool:
+    found = False
+    zip_file = cast(ZipFile, jar._zip)
+
+    # filter the member infos directly; jar.list() would build a FileZip
+    # for each of the (often thousands of) class files just to skip it.
+    # has() below is already a set lookup on the names DirectoryZip read
+    for info in zip_file.infolist():
+        if not info.filename.endswith('.jar'):
+            continue
+        nested_jar_file: IO[bytes]
+        if info.file_size <= NESTED_JAR_SPOOL_SIZE:
+            nested_jar_file = io.BytesIO(zip_file.read(info))
+        else:
+            # ZipFile needs a seekable file, but fat nested jars don't need
+            # to sit in memory whole; spool them to disk instead
+            nested_jar_file = tempfile.SpooledTemporaryFile(
+                max_size=NESTED_JAR_SPOOL_SIZE
+            )
+            with zip_file.open(info) as member:
+                shutil.copyfileobj(member, nested_jar_file, BUF_SIZE)
+            nested_jar_file.seek(0)
+        with nested_jar_file:
+            with ZipFile(nested_jar_file, 'r') as nested_jar:
+                _dir = DirectoryZip(jar, info.filename, nested_jar)
+                # every nested jar has to be visited, they can carry mods
+                # of their own (jarjar), so don't short-circuit on found
+                if _process_jar(_dir, entries):  # yay recursion
+                    found = True
+
+    if jar.has("META-INF/mods.toml"):
+        found = True
+        # read the members straight from the open zip, a FileZip wrapper
+        # per file only adds an object and a path join
+        with zip_file.open("META-INF/mods.toml") as toml_file:
+            toml_data = tomllib.load(toml_file)
+        manifest: Dict[str, str] = {}
+        if jar.has("META-INF/MANIFEST.MF"):
+            manifest = _read_manifest(zip_file.open("META-INF/MANIFEST.MF"))
+
+        entries.append((jar.full_path, toml_data, manifest))
+    return found
+
+
+# runs in a worker process, so it takes and returns plain picklable data
+def _scan_jar(path: str) -> List[JarEntry]:
+    entries: List[JarEntry] = []
+    # ZipFile only reads the central directory and the members we ask
+    # for, asset jars can be huge and are mostly never touched
+    with ZipFile(path, 'r') as jar:
+        _process_jar(DirectoryZip(None, path, jar), entries)
+    return entries
+
+
+# parsed jars are remembered between runs; a jar is re-scanned only when
+# its mtime or size changes
+CACHE_VERSION = 3
+CACHE_PATH = os.path.join(
+    os.environ.get(
+        'XDG_CACHE_HOME',
+        os.path.join(os.path.expanduser('~'), '.cache')
+    ),
+    'mc-packer',
+    'mods.pkl'
+)
+
+# jar path -> ((mtime_ns, size), scan result)
+JarCache = Dict[str, Tuple[Tuple[int, int], List[JarEntry]]]
+
+
+def _read_cache() -> JarCache:
+    try:
+        with open(CACHE_PATH, 'rb') as file:
+            version, jars = pickle.load(file)
+    except Exception:  # missing or unreadable, start over
+        return {}
+    return cast(JarCache, jars) if version == CACHE_VERSION else {}
+
+
+def _write_cache(jars: JarCache) -> None:
+    cache_dir = os.path.dirname(CACHE_PATH)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # a temp file of our own, so concurrent runs can't write into
+        # each other's half-written cache before the replace
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    except OSError:
+        return  # only an optimisation, never fail the run over it
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(
+                (CACHE_VERSION, jars), file, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temp_path, CACHE_PATH)
+    except OSError:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
 class ModPack:
     directory:  DirectoryReal
     mods:       Dict[str, Mod]
@@ -249,224 +491,299 @@ class ModPack:
         self.mods = {}
         self.errors = []
 
-    def process_jar(self, jar: DirectoryZip) -> bool:
-        found = False
-
-        for item in [x for x in jar.list() if x.name.endswith('.jar')]:
-            with io.BytesIO(
-                        cast(ZipFile, jar._zip).read(item.name)
-                    ) as nested_jar_bytes:
-                with ZipFile(nested_jar_bytes, 'r') as nested_jar:
-                    _dir = DirectoryZip(jar, item.name, nested_jar)
-                    found = found or self.process_jar(_dir)  # yay recursion
-
-        if jar.has("META-INF/mods.toml"):
-            found = True
-            toml_data = toml.loads(
-                FileZip("META-INF/mods.toml", jar).read().decode()
-            )
-            manifest = ""
-            if jar.has("META-INF/MANIFEST.MF"):
-                manifest = FileZip(
-                    "META-INF/MANIFEST.MF",
-                    jar
-                ).read().decode()
-
-            mod = Mod.load(self, jar.full_path, toml_data, manifest)
-            if hasattr(mod, 'modid'):
-                self.mods[mod.modid] = mod
-        return found
-
     def load(self) -> bool:
         mod_dir = DirectoryReal(self.directory, 'mods')
-        # for file in self.directory.list():
-        for file in tqdm(mod_dir.list()):
-            if not issubclass(type(file), FileBase):
-                continue
-            file = cast(FileBase, file)
-            if file.name.endswith('.disabled'):
-                continue
-
-            with ZipFile(
-                        os.path.join(mod_dir.full_path, file.name),
-                        'r'
-                    ) as jar:
-                result = self.process_jar(
-                    DirectoryZip(mod_dir, file.name, jar)
+        # scandir entries know their type from readdir and cache stat(),
+        # so there are no FileReal objects or isinstance checks to go through
+        with os.scandir(mod_dir.full_path) as dir_entries:
+            jars = [
+                entry for entry in dir_entries
+                if entry.is_file() and not entry.name.endswith('.disabled')
+            ]
+
+        cache = _read_cache()
+        # the cache is shared by every instance, so key it on absolute
+        # paths; relative ones collide between instances given as '.'
+        paths = [os.path.abspath(jar.path) for jar in jars]
+        keys: List[Tuple[int, int]] = []
+        for jar in jars:
+            stat = jar.stat()
+            keys.append((stat.st_mtime_ns, stat.st_size))
+        stale = [
+            path for path, key in zip(paths, keys)
+            if path not in cache or cache[path][0] != key
+        ]
+
+        # jars don't depend on each other, so unzip and parse them on every
+        # core; only the plain scan results come back to build Mods here
+        scanned: Dict[str, List[JarEntry]] = {}
+        if stale:
+            with ProcessPoolExecutor() as executor:
+                results = executor.map(_scan_jar, stale, chunksize=4)
+                # no bar when stderr is piped, and redraw at most every
+                # 1% or 0.2s when there are thousands of jars
+                progress = tqdm(
+                    results,
+                    total=len(stale),
+                    unit='jar',
+                    disable=not sys.stderr.isatty(),
+                    mininterval=0.2,
+                    miniters=max(1, len(stale) // 100)
                 )
-                if not result:
-                    self.errors.append(
-                        f"Failed to locate mod in jar '{file.name}'"
-                    )
-                    # return False
+                for path, entries in zip(stale, progress):
+                    scanned[path] = entries
+
+        for path, key in zip(paths, keys):
+            if path in scanned:
+                cache[path] = (key, scanned[path])
+        # forget jars that were removed or disabled since the last run
+        current = set(paths)
+        mods_path = os.path.abspath(mod_dir.full_path)
+        removed = [
+            path for path in cache
+            if os.path.dirname(path) == mods_path and path not in current
+        ]
+        for path in removed:
+            del cache[path]
+
+        for jar, abs_path in zip(jars, paths):
+            entries = cache[abs_path][1]
+            if not entries:
+                self.errors.append(
+                    f"Failed to locate mod in jar '{jar.name}'"
+                )
+                # return False
+            for path, toml_data, manifest in entries:
+                # scanned under the absolute path, show it the way the
+                # instance directory was given
+                path = jar.path + path[len(abs_path):]
+                mod = Mod.load(self, path, toml_data, manifest)
+                if mod.modid:
+                    self.mods[mod.modid] = mod
+
+        if stale or removed:
+            _write_cache(cache)
         return True
 
     def validateVersions(self, verbose: bool) -> bool:
         for mod in self.mods.values():
             for dep in mod.dependencies:
-                if dep.modid in self.mods:
-                    dependency = self.mods[dep.modid]
+                dependency = self.mods.get(dep.modid)
+                if dependency is not None:
                     if not dep.validateMod(dependency):
                         dependency.errors.append(
-                            f"'{mod.modid}' requires '{dep.version_reqs}'"
+                            DependencyError(mod.modid, dep, False)
                         )
 
-                    rdep_mod = ModDependency(mod.modid, False, '*')
-                    rdep_mod.version_reqs = dep.version_reqs
-                    dependency.dependents.append(rdep_mod)
+                    dependency.dependents.append(Dependent(mod.modid, dep))
 
                 else:
                     if dep.required and dep.modid not in []:
                         mod.errors.append(
-                            f"Could not find mod '{dep.modid}'! "
-                            f"requirements: {dep.version_reqs}"
+                            DependencyError(dep.modid, dep, True)
                         )
 
         err_num = 0
+        out: List[str] = []  # written in one go below
         for mod in self.mods.values():
             if len(mod.errors) > 0:
                 err_num += 1
                 if verbose:
-                    print(f'{mod.name} ({mod.modid}) {mod._version}:')
-                    print(f' ->  [file]: {mod.filename}')
+                    out.append(f'{mod.name} ({mod.modid}) {mod._version}:')
+                    out.append(f' ->  [file]: {mod.filename}')
                     for error in mod.errors:
-                        print(f' --> {error}')
-                    print()
+                        out.append(f' --> {error}')
+                    out.append('')
 
         for error in self.errors:
             err_num += 1
             if verbose:
-                print(f' -> {error}')
+                out.append(f' -> {error}')
+        if out:
+            sys.stdout.write('\n'.join(out) + '\n')
 
         return err_num == 0
 
     def why_depends(self, modid: str, error: bool) -> None:
-        if modid not in self.mods:
+        mod = self.mods.get(modid)
+        if mod is None:
             print('==================================')
             print(f'why-depends: modid "{modid}" not found!\n')
             return
 
-        mod = self.mods[modid]
-        print(f'{mod.name} ({modid}) [{mod._version}]:')
-        print(f' -> File: "{mod.filename}"\n')
-        print(f' -> Dependencies')
+        version = mod._version
+        out: List[str] = []  # written in one go below
+        out.append(f'{mod.name} ({modid}) [{version}]:')
+        out.append(f' -> File: "{mod.filename}"\n')
+        out.append(f' -> Dependencies')
         for dep in mod.dependencies:
-            vers_reqs_met = any(
-                [range.contains(mod._version) for range in dep.version_reqs]
-            )
+            vers_reqs_met = dep.accepts(version)
             if not error or (error and not vers_reqs_met):
-                dep_mod = self.mods.get(dep.modid, None)
+                dep_mod = self.mods.get(dep.modid)
                 dep_name = dep_mod.name if dep_mod else dep.modid
-                dep_installed = dep.modid in self.mods
-                print(f'   -> name:      {dep_name}')
-                print(f'   -> modid:     {dep.modid}')
-                print(f'   -> required:  {"yes" if dep.required else "no"}')
-                print(f'   -> installed: {"yes" if dep_installed else "no"}')
-                print(f'   -> versions:  {dep.version_reqs}')
-                print()
-
-        print(f' -> Dependents')
-        for dep in mod.dependents:
-            vers_reqs_met = any(
-                [range.contains(mod._version) for range in dep.version_reqs]
-            )
+                dep_installed = dep_mod is not None
+                out.extend([
+                    f'   -> name:      {dep_name}',
+                    f'   -> modid:     {dep.modid}',
+                    f'   -> required:  {"yes" if dep.required else "no"}',
+                    f'   -> installed: {"yes" if dep_installed else "no"}',
+                    f'   -> versions:  {dep.version_reqs}',
+                    '',
+                ])
+
+        out.append(f' -> Dependents')
+        for rdep in mod.dependents:
+            vers_reqs_met = rdep.accepts(version)
             if not error or (error and not vers_reqs_met):
-                dep_mod = self.mods.get(dep.modid, None)
-                dep_name = dep_mod.name if dep_mod else dep.modid
-                dep_installed = dep.modid in self.mods
-                print(f'   -> name:      {dep_name}')
-                print(f'   -> modid:     {dep.modid}')
-                # print(f'   -> required: {dep.required}')
-                print(f'   -> installed: {"yes" if dep_installed else "no"}')
-                print(f'   -> versions:  {dep.version_reqs}')
-                print()
+                dep_mod = self.mods.get(rdep.modid)
+                dep_name = dep_mod.name if dep_mod else rdep.modid
+                dep_installed = dep_mod is not None
+                out.extend([
+                    f'   -> name:      {dep_name}',
+                    f'   -> modid:     {rdep.modid}',
+                    # f'   -> required: {rdep.required}',
+                    f'   -> installed: {"yes" if dep_installed else "no"}',
+                    f'   -> versions:  {rdep.version_reqs}',
+                    '',
+                ])
+        sys.stdout.write('\n'.join(out) + '\n')
 
     def run(self) -> bool:
         return False
 
-    def identifyBrokenMods(self, error: str) -> bool:
-        graphs: List[DependencyGraph] = []
-
-        for mod in self.mods.values():
-            if mod.modid in ['minecraft', 'forge']:
-                continue
-            graph = DependencyGraph(mod)
-            graphs.append(graph)
-            DependencyGraph._ALL_NODES[mod.modid] = graph.nodes[0]
-            DependencyGraph._ALL_GRAPHS[mod.modid] = graph
-
-        # TODO: Merge circular node paths into a single node each
+    # modids ordered so each mod comes after the mods it requires; each
+    # dependency cycle is merged into one node, listed under its first modid
+    def dependencyOrder(
+                self,
+                nodes: Dict[str, DependencyGraph.Node]
+            ) -> List[str]:
+        requires: Dict[str, Set[str]] = {
+            modid: {
+                dep.modid for dep in self.mods[modid].dependencies
+                if dep.required and dep.modid in nodes and dep.modid != modid
+            }
+            for modid in nodes
+        }
+
+        while True:
+            try:
+                return list(TopologicalSorter(requires).static_order())
+            except CycleError as e:
+                cycle: List[str] = e.args[1]  # [a, b, ..., a]
+                keep, merged = cycle[0], set(cycle[1:]) - {cycle[0]}
+                for modid in merged:
+                    nodes[keep].merge(nodes[modid])
+                    requires[keep] |= requires.pop(modid)
+                requires[keep] -= merged | {keep}
+                for deps in requires.values():
+                    if not merged.isdisjoint(deps):
+                        deps -= merged
+                        deps.add(keep)
+                requires[keep].discard(keep)
 
-        def process_graph(graph: DependencyGraph):
-            for node in graph.nodes:
-                for dep in node.dependents:
-                    invalid_modid = dep.modid in ['minecraft', 'forge']
-                    not_installed = dep.modid not in self.mods
-                    if invalid_modid or (not dep.required and not_installed):
-                        continue
-                    mod_graph = DependencyGraph._ALL_GRAPHS[mod.modid]
-                    dep_graph = DependencyGraph._ALL_GRAPHS[dep.modid]
-                    if mod_graph is not dep_graph:
-                        mod_graph.merge(dep_graph)
-                        process_graph(dep_graph)
-                for dep in node.dependencies:
-                    invalid_modid = dep.modid in ['minecraft', 'forge']
-                    not_installed = dep.modid not in self.mods
-                    if invalid_modid or (not dep.required and not_installed):
-                        continue
-                    mod_graph = DependencyGraph._ALL_GRAPHS[mod.modid]
-                    dep_graph = DependencyGraph._ALL_GRAPHS[dep.modid]
-                    if mod_graph is not dep_graph:
-                        mod_graph.merge(dep_graph)
-                        process_graph(dep_graph)
+    def identifyBrokenMods(self, error: str) -> bool:
+        graphs: Dict[str, DependencyGraph] = {}
+        nodes: Dict[str, DependencyGraph.Node] = {}
 
         for mod in self.mods.values():
-            if mod.modid in ['minecraft', 'forge']:
+            if mod.modid in EXCLUDED_MODIDS:
                 continue
-            process_graph(DependencyGraph._ALL_GRAPHS[mod.modid])
+            graph = DependencyGraph(mod, nodes)
+            graphs[mod.modid] = graph
+            nodes[mod.modid] = graph.nodes[0]
+
+        # union-find over modids, with path compression and union by
+        # rank; every dependency edge is visited once, no recursion
+        parent: Dict[str, str] = {modid: modid for modid in graphs}
+        rank: Dict[str, int] = dict.fromkeys(graphs, 0)
+
+        def find(modid: str) -> str:
+            root = modid
+            while parent[root] != root:
+                root = parent[root]
+            while parent[modid] != root:
+                parent[modid], modid = root, parent[modid]
+            return root
+
+        def union(a: str, b: str) -> None:
+            a, b = find(a), find(b)
+            if a == b:
+                return
+            if rank[a] < rank[b]:
+                a, b = b, a
+            parent[b] = a
+            if rank[a] == rank[b]:
+                rank[a] += 1
+
+        # dependents mirror dependencies, so the latter covers every edge
+        for modid in graphs:
+            for dep in self.mods[modid].dependencies:
+                if dep.modid in graphs:
+                    union(modid, dep.modid)
+
+        groups: Dict[str, DependencyGraph] = {}
+        for modid, graph in graphs.items():
+            root = find(modid)
+            if root in groups:
+                groups[root].merge(graph)
+            else:
+                groups[root] = graph
+
+        # merge dependency cycles, then keep each graph's nodes in
+        # dependency order so they can be bisected as a plain list
+        order = self.dependencyOrder(nodes)
+        position = {
+            id(nodes[modid]): i
+            for i, modid in enumerate(order)
+        }
+        for graph in groups.values():
+            graph.nodes.sort(key=lambda node: position[id(node)])
 
         graph_list: List[DependencyGraph] = []
-        for node in DependencyGraph._ALL_NODES.values():
-            if node.graph not in graph_list:
+        seen: Set[int] = set()  # by id, 'in graph_list' was a linear scan
+        for node in nodes.values():
+            if id(node.graph) not in seen:
+                seen.add(id(node.graph))
                 graph_list.append(node.graph)
         # sort by number of mods in graph
-        graph_list = sorted(
-            graph_list,
-            key=(lambda x: sum([len(y.mod_set) for y in x.nodes]))
-        )
+        graph_list = sorted(graph_list, key=lambda x: x.mod_count)
 
+        out: List[str] = []  # written in one go below
         for i, graph in enumerate(graph_list):
-            print('==================================')
-            mod_count = sum([len(y.mod_set) for y in graph.nodes])
-            print(f'Graph {i} ({mod_count} mods):')
+            out.append('==================================')
+            out.append(f'Graph {i} ({graph.mod_count} mods):')
             for node in graph.nodes:
                 for mod in node.mod_set:
-                    print(f" -> '{mod.modid}'")
-            print()
+                    out.append(f" -> '{mod.modid}'")
+            out.append('')
+        if out:
+            sys.stdout.write('\n'.join(out) + '\n')
 
         print(f'total loaded mods: {len(self.mods)}')
         print(f'total separate graphs: {len(graph_list)}')
 
         missing_count = 0
-        for modid in self.mods.keys():
-            invalid_modid = modid in ['minecraft', 'forge']
-            mod_installed = modid in DependencyGraph._ALL_NODES.keys()
+        for modid, mod in self.mods.items():
+            invalid_modid = modid in EXCLUDED_MODIDS
+            mod_installed = modid in nodes
             if not mod_installed and not invalid_modid:
                 missing_count += 1
-                mod_name = self.mods[modid].name
-                print(f'Missing graph for mod "{mod_name}" ({modid})')
+                print(f'Missing graph for mod "{mod.name}" ({modid})')
         print(f'Missing graphs for {missing_count} mods')
 
         logs = DirectoryReal(self.directory, "logs")
 
         error_files = ['latest.log', 'debug.log', 'latest_stdout.log']
         search_filename = ''
-        for candidate in error_files:
-            log_exists = logs.has(candidate)
-            log = FileReal(logs, candidate)
-            log_has_error = error in log.read().decode(errors="ignore")
-            if log_exists and log_has_error:
+        needle = error.encode()
+        # the last matching file wins, so check from the end and stop at
+        # the first hit; missing logs are skipped before opening anything
+        for candidate in reversed(error_files):
+            if not logs.has(candidate):
+                continue
+            if FileReal(logs, candidate).contains(needle):
                 search_filename = candidate
+                break
 
         if search_filename:
             print(f'Scanning "{search_filename}"')
@@ -480,17 +797,17 @@ class ModPack:
         # find the only True value in the list
         # number of iterations = int(ceil(log2(len(graph_list))))
         def binaryGraphElimination(_list: List[DependencyGraph]) -> int:
-            __list = [DependencyGraph(Mod(self))] + _list
+            __list = [DependencyGraph(Mod(self), {})] + _list
             left = 0
             right = len(__list) - 1
 
             while left <= right:
                 mid = (left + right) // 2
                 # TODO: Disable graphs in __list[mid:]
-                for graph in __list[mid:]:
+                for graph in islice(__list, mid, None):
                     graph.disable_all()
                 result = self.run()  # return True if run occurs successfully
-                if any(__list[mid:]):
+                if any(islice(__list, mid, None)):
                     left = mid + 1
                 else:
                     right = mid - 1
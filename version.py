@@ -1,13 +1,37 @@
 
-from attrs import define
+from attrs import define, field
 
-from typing import cast, List
+from typing import List, Dict, Tuple, Optional
+from functools import lru_cache, total_ordering
+import string
 import sys
 import re
 
 
 VERSION_DELIMITERS = ['+', '_', ':']
 
+# used by Version.fromString to filter and rewrite the version parts
+TEXT_ONLY_RE = re.compile(r'(?!\.)[0-9]*[a-z]+[0-9a-z]*$')
+VERSION_CHARS_RE = re.compile(r'^[a-z0-9.]+$')
+WORD_RE = re.compile(r'[.]*([a-z]+[.]+)')
+DIGIT_LETTER_RE = re.compile(r'[0-9]([a-z])')
+LETTER_RE = re.compile(r'([a-z])')
+LETTER_INDEX: Dict[int, str] = {
+    ord(letter): str(idx)
+    for idx, letter in enumerate(string.ascii_lowercase, 1)
+}
+LETTER_DOTTED_INDEX: Dict[int, str] = {
+    code: '.' + idx for code, idx in LETTER_INDEX.items()
+}
+
+# used by VersionRange.fromString; a bare version means [v,v]
+SINGLE_VERSION_RE = re.compile(r'^[a-zA-Z0-9-+:_.]+$')
+RANGE_RE = re.compile(r'([\[\(][0-9a-zA-Z+-_:., ]*[\]\)])')
+
+
+# Version._key: one tuple of ints per part, trailing empty parts dropped
+VersionKey = Tuple[Tuple[int, ...], ...]
+
 
 class BadVersionString(ValueError):
     ...
@@ -17,9 +41,19 @@ class ValidationFailure(Exception):
     ...
 
 
+@total_ordering
 @define
 class VersionPart:
     components: List[int]
+    # components without trailing zeros: 1.2 == 1.2.0, and plain tuple
+    # comparison then matches comparing zero-padded component lists
+    _key: Tuple[int, ...] = field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        end = len(self.components)
+        while end > 0 and self.components[end - 1] == 0:
+            end -= 1
+        self._key = tuple(self.components[:end])
 
     def __str__(self) -> str:
         return '.'.join([str(x) for x in self.components])
@@ -27,61 +61,30 @@ class VersionPart:
     def __repr__(self):
         return self.__str__()
 
+    def __hash__(self) -> int:
+        return hash(self._key)
+
     def __eq__(self, other: 'VersionPart') -> bool:  # type: ignore[override]
-        for i in range(max(len(self.components), len(other.components))):
-            a = self.components[i] if len(self.components) > i else 0
-            b = other.components[i] if len(other.components) > i else 0
-            if a < b:
-                return False
-            elif a > b:
-                return False
-        return True
+        return self._key == other._key
 
     def __lt__(self, other: 'VersionPart') -> bool:
-        for i in range(max(len(self.components), len(other.components))):
-            a = self.components[i] if len(self.components) > i else 0
-            b = other.components[i] if len(other.components) > i else 0
-            if a < b:
-                return True
-            elif a > b:
-                return False
-        return False
-
-    def __le__(self, other: 'VersionPart') -> bool:
-        for i in range(max(len(self.components), len(other.components))):
-            a = self.components[i] if len(self.components) > i else 0
-            b = other.components[i] if len(other.components) > i else 0
-            if a < b:
-                return True
-            elif a > b:
-                return False
-        return True
-
-    def __gt__(self, other: 'VersionPart') -> bool:
-        for i in range(max(len(self.components), len(other.components))):
-            a = self.components[i] if len(self.components) > i else 0
-            b = other.components[i] if len(other.components) > i else 0
-            if a > b:
-                return True
-            elif a < b:
-                return False
-        return False
-
-    def __ge__(self, other: 'VersionPart') -> bool:
-        for i in range(max(len(self.components), len(other.components))):
-            a = self.components[i] if len(self.components) > i else 0
-            b = other.components[i] if len(other.components) > i else 0
-            if a > b:
-                return True
-            elif a < b:
-                return False
-        return True
+        return self._key < other._key
 
 
+@total_ordering
 @define
 class Version:
     text: str
     parts: List[VersionPart] = []
+    # part keys without trailing empty (all-zero) parts, same idea as
+    # VersionPart._key
+    _key: VersionKey = field(init=False, repr=False)
+
+    def __attrs_post_init__(self) -> None:
+        end = len(self.parts)
+        while end > 0 and not self.parts[end - 1]._key:
+            end -= 1
+        self._key = tuple(part._key for part in self.parts[:end])
 
     def __str__(self) -> str:
         if self.text != "*":
@@ -92,7 +95,10 @@ class Version:
     def __repr__(self):
         return self.__str__()
 
+    # mod packs repeat the same few version strings over and over; the
+    # parsed Versions are shared, so treat them as read-only
     @classmethod
+    @lru_cache(maxsize=4096)
     def fromString(cls, text_raw: str) -> 'Version':
         if text_raw in ["", "*"]:
             return cls("*")
@@ -118,22 +124,24 @@ class Version:
             # disallow candidates that are:
             #   - text-only
             #   - commit refs
-            if re.fullmatch(r'(?!\.)[0-9]*[a-z]+[0-9a-z]*$', candidate):
+            if TEXT_ONLY_RE.fullmatch(candidate):
                 continue
 
-            elif re.fullmatch(r'^[a-z0-9.]+$', candidate):
-                for word in re.findall(r'[.]*([a-z]+[.]+)', candidate):
+            elif VERSION_CHARS_RE.fullmatch(candidate):
+                for word in WORD_RE.findall(candidate):
                     candidate = candidate.replace(word, '')
 
-                for letter in re.findall(r'[0-9]([a-z])', candidate):
-                    letter = cast(str, letter)
-                    idx = ord(letter) - ord('a') + 1
-                    candidate = candidate.replace(f'{letter}', f'.{idx}')
-
-                for letter in re.findall(r'([a-z])', candidate):
-                    letter = cast(str, letter)
-                    idx = ord(letter) - ord('a') + 1
-                    candidate = candidate.replace(f'{letter}', f'{idx}')
+                # letters become their alphabet index ('a' -> 1), as a new
+                # component ('.1') for any letter that follows a digit
+                # somewhere in the candidate; one translate() pass
+                if LETTER_RE.search(candidate):
+                    table = LETTER_INDEX
+                    dotted = DIGIT_LETTER_RE.findall(candidate)
+                    if dotted:
+                        table = LETTER_INDEX.copy()
+                        for code in map(ord, dotted):
+                            table[code] = LETTER_DOTTED_INDEX[code]
+                    candidate = candidate.translate(table)
 
                 valid_parts.append(candidate)
 
@@ -148,55 +156,14 @@ class Version:
 
         raise BadVersionString(f"Invalid version string '{text}'")
 
+    def __hash__(self) -> int:
+        return hash(self._key)
+
     def __eq__(self, other: 'Version') -> bool:  # type: ignore[override]
-        for i in range(max(len(self.parts), len(other.parts))):
-            a = self.parts[i] if len(self.parts) > i else VersionPart([0])
-            b = other.parts[i] if len(other.parts) > i else VersionPart([0])
-            if a < b:
-                return False
-            elif a > b:
-                return False
-        return True
+        return self._key == other._key
 
     def __lt__(self, other: 'Version') -> bool:
-        for i in range(max(len(self.parts), len(other.parts))):
-            a = self.parts[i] if len(self.parts) > i else VersionPart([0])
-            b = other.parts[i] if len(other.parts) > i else VersionPart([0])
-            if a < b:
-                return True
-            elif a > b:
-                return False
-        return False
-
-    def __le__(self, other: 'Version') -> bool:
-        for i in range(max(len(self.parts), len(other.parts))):
-            a = self.parts[i] if len(self.parts) > i else VersionPart([0])
-            b = other.parts[i] if len(other.parts) > i else VersionPart([0])
-            if a < b:
-                return True
-            elif a > b:
-                return False
-        return True
-
-    def __gt__(self, other: 'Version') -> bool:
-        for i in range(max(len(self.parts), len(other.parts))):
-            a = self.parts[i] if len(self.parts) > i else VersionPart([0])
-            b = other.parts[i] if len(other.parts) > i else VersionPart([0])
-            if a > b:
-                return True
-            elif a < b:
-                return False
-        return False
-
-    def __ge__(self, other: 'Version') -> bool:
-        for i in range(max(len(self.parts), len(other.parts))):
-            a = self.parts[i] if len(self.parts) > i else VersionPart([0])
-            b = other.parts[i] if len(other.parts) > i else VersionPart([0])
-            if a > b:
-                return True
-            elif a < b:
-                return False
-        return True
+        return self._key < other._key
 
 
 @define
@@ -209,6 +176,18 @@ class VersionRangePart:
 class VersionRange:
     lower: VersionRangePart
     upper: VersionRangePart
+    # Version._key of each bound for contains(), None for a '*' bound
+    _lower_key: Optional[VersionKey] = field(
+        init=False, repr=False, eq=False
+    )
+    _upper_key: Optional[VersionKey] = field(
+        init=False, repr=False, eq=False
+    )
+
+    def __attrs_post_init__(self) -> None:
+        lower, upper = self.lower.bound, self.upper.bound
+        self._lower_key = None if lower.text == "*" else lower._key
+        self._upper_key = None if upper.text == "*" else upper._key
 
     def __str__(self) -> str:
         if self.upper.bound.text == "*" and self.lower.bound.text == "*":
@@ -223,44 +202,39 @@ class VersionRange:
         return self.__str__()
 
     def contains(self, version: Version) -> bool:
-        result = True
+        key = version._key
 
-        if self.lower.bound.text == "*":
-            pass
-        elif self.lower.inclusive:
-            comp = (self.lower.bound <= version)
-            result = result and comp
-        else:
-            comp = (self.lower.bound < version)
-            result = result and comp
-
-        if self.upper.bound.text == "*":
-            pass
-        elif self.upper.inclusive:
-            comp = (self.upper.bound >= version)
-            result = result and comp
-        else:
-            comp = (self.upper.bound > version)
-            result = result and comp
+        lower = self._lower_key
+        if lower is not None:
+            if key < lower or (key == lower and not self.lower.inclusive):
+                return False
 
-        return result
+        upper = self._upper_key
+        if upper is not None:
+            if key > upper or (key == upper and not self.upper.inclusive):
+                return False
+
+        return True
 
     @classmethod
     def fromString(cls, range_raw: str) -> List['VersionRange']:
+        # the parsed ranges are shared (read-only), only the list is new
+        return list(cls._fromString(range_raw))
+
+    @classmethod
+    @lru_cache(maxsize=4096)
+    def _fromString(cls, range_raw: str) -> Tuple['VersionRange', ...]:
         ranges: List['VersionRange'] = []
 
         if range_raw in ["*", ","]:
             any_range_part = VersionRangePart(Version.fromString("*"), True)
-            return [cls(any_range_part, any_range_part)]
-        elif re.fullmatch(r'^[a-zA-Z0-9-+:_.]+$', range_raw):
+            return (cls(any_range_part, any_range_part),)
+        elif SINGLE_VERSION_RE.fullmatch(range_raw):
             vrp = VersionRangePart(Version.fromString(range_raw), True)
-            return [cls(vrp, vrp)]
+            return (cls(vrp, vrp),)
 
         found = False
-        for range in re.findall(
-                    r'([\[\(][0-9a-zA-Z+-_:., ]*[\]\)])',
-                    range_raw
-                ):
+        for range in RANGE_RE.findall(range_raw):
             found = True
             parts = range.split(',')
             lower = parts[0].strip()
@@ -286,7 +260,7 @@ class VersionRange:
         if not found:
             raise BadVersionString(f"Could not form from '{range_raw}'")
 
-        return ranges
+        return tuple(ranges)
 
 
 def test():